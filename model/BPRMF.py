@@ -4,7 +4,7 @@ from torch.nn import functional as F
 
 
 def _L2_loss_mean(x):
-    return torch.mean(torch.sum(torch.pow(x, 2), dim=1, keepdim=False) / 2.)
+    return 0.5 * x.pow(2).sum() / x.shape[0]
 
 
 class BPRMF(nn.Module):
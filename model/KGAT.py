@@ -1,13 +1,14 @@
+import ast
+
 import dgl
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from dgl.nn.pytorch.softmax import edge_softmax
-from utility.helper import edge_softmax_fix
 
 
 def _L2_loss_mean(x):
-    return torch.mean(torch.sum(torch.pow(x, 2), dim=1, keepdim=False) / 2.)
+    return 0.5 * x.pow(2).sum() / x.shape[0]
 
 
 class Aggregator(nn.Module):
@@ -35,7 +36,8 @@ class Aggregator(nn.Module):
 
 
     def forward(self, mode, g, entity_embed):
-        g = g.local_var()
+        # the caller (KGAT.cf_embedding) already works on a local copy of the
+        # graph, so no per-layer local_var frame copy is needed here
         g.ndata['node'] = entity_embed
 
         # Equation (3) & (10)
@@ -48,19 +50,25 @@ class Aggregator(nn.Module):
         else:
             g.update_all(dgl.function.u_mul_e('node', 'att', 'side'), dgl.function.sum('side', 'N_h'))
 
+        node = entity_embed
+        N_h = g.ndata['N_h']
+
         if self.aggregator_type == 'gcn':
             # Equation (6) & (9)
-            out = self.activation(self.W(g.ndata['node'] + g.ndata['N_h']))                         # (n_users + n_entities, out_dim)
+            out = self.activation(self.W(node + N_h))                           # (n_users + n_entities, out_dim)
 
         elif self.aggregator_type == 'graphsage':
             # Equation (7) & (9)
-            out = self.activation(self.W(torch.cat([g.ndata['node'], g.ndata['N_h']], dim=1)))      # (n_users + n_entities, out_dim)
+            out = self.activation(self.W(torch.cat([node, N_h], dim=1)))        # (n_users + n_entities, out_dim)
 
         elif self.aggregator_type == 'bi-interaction':
             # Equation (8) & (9)
-            out1 = self.activation(self.W1(g.ndata['node'] + g.ndata['N_h']))                       # (n_users + n_entities, out_dim)
-            out2 = self.activation(self.W2(g.ndata['node'] * g.ndata['N_h']))                       # (n_users + n_entities, out_dim)
-            out = out1 + out2
+            # one batched GEMM for both W1(node + N_h) and W2(node * N_h)
+            stacked = torch.stack([node + N_h, node * N_h], dim=0)                                  # (2, n_users + n_entities, in_dim)
+            weight = torch.stack([self.W1.weight, self.W2.weight], dim=0).transpose(1, 2)           # (2, in_dim, out_dim)
+            bias = torch.stack([self.W1.bias, self.W2.bias], dim=0).unsqueeze(1)                    # (2, 1, out_dim)
+            out = self.activation(torch.baddbmm(bias, stacked, weight))                             # (2, n_users + n_entities, out_dim)
+            out = out[0] + out[1]
         else:
             raise NotImplementedError
 
@@ -85,13 +93,17 @@ class KGAT(nn.Module):
         self.relation_dim = args.relation_dim
 
         self.aggregation_type = args.aggregation_type
-        self.conv_dim_list = [args.entity_dim] + eval(args.conv_dim_list)
-        self.mess_dropout = eval(args.mess_dropout)
-        self.n_layers = len(eval(args.conv_dim_list))
+        self.conv_dim_list = [args.entity_dim] + ast.literal_eval(args.conv_dim_list)
+        self.mess_dropout = ast.literal_eval(args.mess_dropout)
+        self.n_layers = len(self.conv_dim_list) - 1
+        # width of the layer-concatenated embeddings returned by cf_embedding
+        self.cf_concat_dim = sum(self.conv_dim_list)
 
         self.kg_l2loss_lambda = args.kg_l2loss_lambda
         self.cf_l2loss_lambda = args.cf_l2loss_lambda
 
+        self.use_autocast = getattr(args, 'use_autocast', 0)
+
         self.relation_embed = nn.Embedding(self.n_relations, self.relation_dim)
         self.entity_user_embed = nn.Embedding(self.n_entities + self.n_users, self.entity_dim)
         if (self.use_pretrain == 1) and (user_pre_embed is not None) and (item_pre_embed is not None):
@@ -107,25 +119,49 @@ class KGAT(nn.Module):
         for k in range(self.n_layers):
             self.aggregator_layers.append(Aggregator(self.conv_dim_list[k], self.conv_dim_list[k + 1], self.mess_dropout[k], self.aggregation_type))
 
-
-    def att_score(self, edges):
-        # Equation (4)
-        r_mul_t = torch.matmul(self.entity_user_embed(edges.src['id']), self.W_r)                       # (n_edge, relation_dim)
-        r_mul_h = torch.matmul(self.entity_user_embed(edges.dst['id']), self.W_r)                       # (n_edge, relation_dim)
-        r_embed = self.relation_embed(edges.data['type'])                                               # (1, relation_dim)
-        att = torch.bmm(r_mul_t.unsqueeze(1), torch.tanh(r_mul_h + r_embed).unsqueeze(2)).squeeze(-1)   # (n_edge, 1)
-        return {'att': att}
+        # per-graph cache of (edge ids, tail ids, head ids) bucketed by relation
+        # type on the feature device, keyed by id(graph); each entry keeps a
+        # reference to its graph so the id cannot be recycled by a later
+        # allocation, and reuse is guarded by an identity check
+        self._att_edge_buckets = {}
 
 
     def compute_attention(self, g):
+        cached = self._att_edge_buckets.get(id(g))
+        if cached is not None and cached[0] is g:
+            buckets = cached[1]
+        else:
+            etype = g.edata['type']
+            # DGL 0.4 keeps the graph structure on CPU even after g.to(device)
+            # moves ndata/edata, so bring the endpoints from g.edges() over to
+            # the feature device once and cache them pre-gathered per relation
+            src, dst = g.edges()
+            src = src.to(etype.device)
+            dst = dst.to(etype.device)
+            buckets = []
+            for i in range(self.n_relations):
+                eids = torch.nonzero(etype == i).view(-1)
+                buckets.append((eids, src[eids], dst[eids]))
+            self._att_edge_buckets[id(g)] = (g, buckets)
+
         g = g.local_var()
-        for i in range(self.n_relations):
-            edge_idxs = g.filter_edges(lambda edge: edge.data['type'] == i)
-            self.W_r = self.W_R[i]
-            g.apply_edges(self.att_score, edge_idxs)
+        # g.ndata['id'] is the identity mapping arange(n_users + n_entities),
+        # so use the embedding table directly instead of gathering a full copy
+        all_embed = self.entity_user_embed.weight                                           # (n_users + n_entities, entity_dim)
+
+        # Equation (4)
+        # compute each relation's edges with plain tensor ops instead of
+        # filter_edges / apply_edges, which scan all edges with a Python UDF per relation
+        att = all_embed.new_empty(g.number_of_edges(), 1)
+        for i, (eids, t_ids, h_ids) in enumerate(buckets):
+            # one GEMM for both the tail and head projections of this relation
+            th_embed = torch.cat([all_embed[t_ids], all_embed[h_ids]], dim=0)               # (2 * n_edge_r, entity_dim)
+            r_mul_t, r_mul_h = torch.matmul(th_embed, self.W_R[i]).chunk(2, dim=0)          # (n_edge_r, relation_dim) each
+            r_embed = self.relation_embed.weight[i]                                         # (relation_dim)
+            att[eids] = torch.sum(r_mul_t * torch.tanh(r_mul_h + r_embed), dim=1, keepdim=True)
 
         # Equation (5)
-        g.edata['att'] = edge_softmax_fix(g, g.edata.pop('att'))
+        g.edata['att'] = edge_softmax(g, att)
         return g.edata.pop('att')
 
 
@@ -137,15 +173,15 @@ class KGAT(nn.Module):
         neg_t:  (kg_batch_size)
         """
         r_embed = self.relation_embed(r)                 # (kg_batch_size, relation_dim)
-        W_r = self.W_R[r]                                # (kg_batch_size, entity_dim, relation_dim)
+        W_r = self.W_R.index_select(0, r)                # (kg_batch_size, entity_dim, relation_dim)
 
         h_embed = self.entity_user_embed(h)              # (kg_batch_size, entity_dim)
         pos_t_embed = self.entity_user_embed(pos_t)      # (kg_batch_size, entity_dim)
         neg_t_embed = self.entity_user_embed(neg_t)      # (kg_batch_size, entity_dim)
 
-        r_mul_h = torch.bmm(h_embed.unsqueeze(1), W_r).squeeze(1)             # (kg_batch_size, relation_dim)
-        r_mul_pos_t = torch.bmm(pos_t_embed.unsqueeze(1), W_r).squeeze(1)     # (kg_batch_size, relation_dim)
-        r_mul_neg_t = torch.bmm(neg_t_embed.unsqueeze(1), W_r).squeeze(1)     # (kg_batch_size, relation_dim)
+        # one bmm over the stacked (h, pos_t, neg_t) embeddings; W_r is shared across the three
+        hpt_embed = torch.stack([h_embed, pos_t_embed, neg_t_embed], dim=1)           # (kg_batch_size, 3, entity_dim)
+        r_mul_h, r_mul_pos_t, r_mul_neg_t = torch.bmm(hpt_embed, W_r).unbind(dim=1)   # (kg_batch_size, relation_dim) each
 
         # Equation (1)
         pos_score = torch.sum(torch.pow(r_mul_h + r_embed - r_mul_pos_t, 2), dim=1)     # (kg_batch_size)
@@ -161,8 +197,25 @@ class KGAT(nn.Module):
 
 
     def cf_embedding(self, mode, g):
+        if self.use_autocast == 1 and hasattr(torch, 'autocast'):
+            # bfloat16 for the aggregation GEMM stack; callers see fp32 again,
+            # so the losses and the final dot products stay in full precision
+            device_type = self.entity_user_embed.weight.device.type
+            with torch.autocast(device_type=device_type, dtype=torch.bfloat16):
+                all_embed = self._cf_embedding(mode, g, dtype=torch.bfloat16)
+            return all_embed.float()
+        return self._cf_embedding(mode, g)
+
+
+    def _cf_embedding(self, mode, g, dtype=None):
         g = g.local_var()
-        ego_embed = self.entity_user_embed(g.ndata['id'])
+        # g.ndata['id'] is the identity mapping arange(n_users + n_entities),
+        # so use the embedding table directly instead of gathering a full copy
+        ego_embed = self.entity_user_embed.weight
+        if dtype is not None:
+            # keep node and edge data in one dtype for DGL's message passing
+            ego_embed = ego_embed.to(dtype)
+            g.edata['att'] = g.edata['att'].to(dtype)
         all_embed = [ego_embed]
 
         for i, layer in enumerate(self.aggregator_layers):
@@ -196,9 +249,13 @@ class KGAT(nn.Module):
         item_neg_ids:   (cf_batch_size)
         """
         all_embed = self.cf_embedding(mode, g)                      # (n_users + n_entities, cf_concat_dim)
-        user_embed = all_embed[user_ids]                            # (cf_batch_size, cf_concat_dim)
-        item_pos_embed = all_embed[item_pos_ids]                    # (cf_batch_size, cf_concat_dim)
-        item_neg_embed = all_embed[item_neg_ids]                    # (cf_batch_size, cf_concat_dim)
+
+        # ids repeat within a batch; gather each distinct row once and index back
+        batch_ids = torch.cat([user_ids, item_pos_ids, item_neg_ids])
+        unique_ids, inverse = torch.unique(batch_ids, return_inverse=True)
+        batch_embed = all_embed[unique_ids][inverse]
+        user_embed, item_pos_embed, item_neg_embed = batch_embed.split(
+            [user_ids.shape[0], item_pos_ids.shape[0], item_neg_ids.shape[0]], dim=0)   # (cf_batch_size, cf_concat_dim) each
 
         # Equation (12)
         pos_score = torch.sum(user_embed * item_pos_embed, dim=1)   # (cf_batch_size)
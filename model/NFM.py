@@ -1,3 +1,5 @@
+import ast
+
 import torch
 from torch import nn
 from torch.nn import functional as F
@@ -40,9 +42,9 @@ class NFM(nn.Module):
 
         self.embed_dim = args.embed_dim
 
-        self.hidden_dim_list = [args.embed_dim] + eval(args.hidden_dim_list)
-        self.mess_dropout = eval(args.mess_dropout)
-        self.n_layers = len(eval(args.hidden_dim_list))
+        self.hidden_dim_list = [args.embed_dim] + ast.literal_eval(args.hidden_dim_list)
+        self.mess_dropout = ast.literal_eval(args.mess_dropout)
+        self.n_layers = len(self.hidden_dim_list) - 1
 
         self.linear = nn.Linear(self.n_features, 1)
 
@@ -1,5 +1,4 @@
 import os
-import random
 import collections
 
 import dgl
@@ -85,7 +84,9 @@ class DataLoaderKGAT(object):
         kg_data = pd.concat([kg_data, reverse_kg_data], axis=0, ignore_index=True, sort=False)
 
         # re-map user id
-        kg_data['r'] += 2
+        # relation ids 0 and 1 are reserved for the user->item interaction and its reverse
+        n_interact_relations = 2
+        kg_data['r'] += n_interact_relations
         self.n_relations = max(kg_data['r']) + 1
         self.n_entities = max(max(kg_data['h']), max(kg_data['t'])) + 1
         self.n_users_entities = self.n_users + self.n_entities
@@ -120,20 +121,49 @@ class DataLoaderKGAT(object):
         self.n_kg_test = len(self.kg_test_data)
 
         # construct kg dict
+        # iterate the underlying numpy columns directly; iterrows builds a pandas Series per row
         self.train_kg_dict = collections.defaultdict(list)
         self.train_relation_dict = collections.defaultdict(list)
-        for row in self.kg_train_data.iterrows():
-            h, r, t = row[1]
+        for h, r, t in zip(self.kg_train_data['h'].values, self.kg_train_data['r'].values, self.kg_train_data['t'].values):
             self.train_kg_dict[h].append((t, r))
             self.train_relation_dict[r].append((h, t))
 
         self.test_kg_dict = collections.defaultdict(list)
         self.test_relation_dict = collections.defaultdict(list)
-        for row in self.kg_test_data.iterrows():
-            h, r, t = row[1]
+        for h, r, t in zip(self.kg_test_data['h'].values, self.kg_test_data['r'].values, self.kg_test_data['t'].values):
             self.test_kg_dict[h].append((t, r))
             self.test_relation_dict[r].append((h, t))
 
+        # set versions of the static train dicts, built once,
+        # for O(1) membership tests during negative sampling
+        self.train_user_set = {u: set(items.tolist()) for u, items in self.train_user_dict.items()}
+        self.train_kg_set = {h: set(triples) for h, triples in self.train_kg_dict.items()}
+
+        # CSR view of the train user->item lists for vectorized batch sampling:
+        # row (u - n_entities) holds train_user_dict[u]
+        self.train_user_ids = np.array(sorted(self.train_user_dict.keys()), dtype=np.int64)
+        lengths = np.zeros(self.n_users, dtype=np.int64)
+        for u, items in self.train_user_dict.items():
+            lengths[u - self.n_entities] = len(items)
+        self.train_user_indptr = np.concatenate([[0], np.cumsum(lengths)])
+        self.train_user_indices = np.zeros(self.train_user_indptr[-1], dtype=np.int64)
+        for u, items in self.train_user_dict.items():
+            row = u - self.n_entities
+            self.train_user_indices[self.train_user_indptr[row]: self.train_user_indptr[row + 1]] = items
+
+        # CSR view of the train kg dict (head -> (tail, relation) pairs), same idea as above
+        self.train_kg_heads = np.array(sorted(self.train_kg_dict.keys()), dtype=np.int64)
+        kg_lengths = np.zeros(self.n_users_entities, dtype=np.int64)
+        for h, triples in self.train_kg_dict.items():
+            kg_lengths[h] = len(triples)
+        self.train_kg_indptr = np.concatenate([[0], np.cumsum(kg_lengths)])
+        self.train_kg_tails = np.zeros(self.train_kg_indptr[-1], dtype=np.int64)
+        self.train_kg_relations = np.zeros(self.train_kg_indptr[-1], dtype=np.int64)
+        for h, triples in self.train_kg_dict.items():
+            triples = np.asarray(triples, dtype=np.int64)
+            self.train_kg_tails[self.train_kg_indptr[h]: self.train_kg_indptr[h + 1]] = triples[:, 0]
+            self.train_kg_relations[self.train_kg_indptr[h]: self.train_kg_indptr[h + 1]] = triples[:, 1]
+
 
     def print_info(self, logging):
         logging.info('n_users:            %d' % self.n_users)
@@ -159,47 +189,21 @@ class DataLoaderKGAT(object):
         return g
 
 
-    def sample_pos_items_for_u(self, user_dict, user_id, n_sample_pos_items):
-        pos_items = user_dict[user_id]
-        n_pos_items = len(pos_items)
-
-        sample_pos_items = []
-        while True:
-            if len(sample_pos_items) == n_sample_pos_items:
-                break
-
-            pos_item_idx = np.random.randint(low=0, high=n_pos_items, size=1)[0]
-            pos_item_id = pos_items[pos_item_idx]
-            if pos_item_id not in sample_pos_items:
-                sample_pos_items.append(pos_item_id)
-        return sample_pos_items
-
-
-    def sample_neg_items_for_u(self, user_dict, user_id, n_sample_neg_items):
-        pos_items = user_dict[user_id]
+    def generate_cf_batch(self):
+        replace = self.cf_batch_size > len(self.train_user_ids)
+        batch_user = np.random.choice(self.train_user_ids, size=self.cf_batch_size, replace=replace)
 
-        sample_neg_items = []
-        while True:
-            if len(sample_neg_items) == n_sample_neg_items:
-                break
+        # positive items: one vectorized CSR lookup for the whole batch
+        starts = self.train_user_indptr[batch_user - self.n_entities]
+        lengths = self.train_user_indptr[batch_user - self.n_entities + 1] - starts
+        batch_pos_item = self.train_user_indices[starts + np.random.randint(0, lengths)]
 
-            neg_item_id = np.random.randint(low=0, high=self.n_items, size=1)[0]
-            if neg_item_id not in pos_items and neg_item_id not in sample_neg_items:
-                sample_neg_items.append(neg_item_id)
-        return sample_neg_items
-
-
-    def generate_cf_batch(self, user_dict):
-        exist_users = user_dict.keys()
-        if self.cf_batch_size <= len(exist_users):
-            batch_user = random.sample(exist_users, self.cf_batch_size)
-        else:
-            batch_user = [random.choice(exist_users) for _ in range(self.cf_batch_size)]
-
-        batch_pos_item, batch_neg_item = [], []
-        for u in batch_user:
-            batch_pos_item += self.sample_pos_items_for_u(user_dict, u, 1)
-            batch_neg_item += self.sample_neg_items_for_u(user_dict, u, 1)
+        # negative items: draw for the whole batch at once and re-draw collisions
+        batch_neg_item = np.random.randint(0, self.n_items, size=self.cf_batch_size)
+        invalid = np.array([item in self.train_user_set[u] for u, item in zip(batch_user, batch_neg_item)])
+        while invalid.any():
+            batch_neg_item[invalid] = np.random.randint(0, self.n_items, size=int(invalid.sum()))
+            invalid[invalid] = [item in self.train_user_set[u] for u, item in zip(batch_user[invalid], batch_neg_item[invalid])]
 
         batch_user = torch.LongTensor(batch_user)
         batch_pos_item = torch.LongTensor(batch_pos_item)
@@ -207,54 +211,23 @@ class DataLoaderKGAT(object):
         return batch_user, batch_pos_item, batch_neg_item
 
 
-    def sample_pos_triples_for_h(self, kg_dict, head, n_sample_pos_triples):
-        pos_triples = kg_dict[head]
-        n_pos_triples = len(pos_triples)
-
-        sample_relations, sample_pos_tails = [], []
-        while True:
-            if len(sample_relations) == n_sample_pos_triples:
-                break
-
-            pos_triple_idx = np.random.randint(low=0, high=n_pos_triples, size=1)[0]
-            tail = pos_triples[pos_triple_idx][0]
-            relation = pos_triples[pos_triple_idx][1]
-
-            if relation not in sample_relations and tail not in sample_pos_tails:
-                sample_relations.append(relation)
-                sample_pos_tails.append(tail)
-        return sample_relations, sample_pos_tails
-
-
-    def sample_neg_triples_for_h(self, kg_dict, head, relation, n_sample_neg_triples):
-        pos_triples = kg_dict[head]
-
-        sample_neg_tails = []
-        while True:
-            if len(sample_neg_tails) == n_sample_neg_triples:
-                break
-
-            tail = np.random.randint(low=0, high=self.n_users_entities, size=1)[0]
-            if (tail, relation) not in pos_triples and tail not in sample_neg_tails:
-                sample_neg_tails.append(tail)
-        return sample_neg_tails
-
-
-    def generate_kg_batch(self, kg_dict):
-        exist_heads = kg_dict.keys()
-        if self.kg_batch_size <= len(exist_heads):
-            batch_head = random.sample(exist_heads, self.kg_batch_size)
-        else:
-            batch_head = [random.choice(exist_heads) for _ in range(self.kg_batch_size)]
+    def generate_kg_batch(self):
+        replace = self.kg_batch_size > len(self.train_kg_heads)
+        batch_head = np.random.choice(self.train_kg_heads, size=self.kg_batch_size, replace=replace)
 
-        batch_relation, batch_pos_tail, batch_neg_tail = [], [], []
-        for h in batch_head:
-            relation, pos_tail = self.sample_pos_triples_for_h(kg_dict, h, 1)
-            batch_relation += relation
-            batch_pos_tail += pos_tail
+        # positive triples: one vectorized CSR lookup for the whole batch
+        starts = self.train_kg_indptr[batch_head]
+        lengths = self.train_kg_indptr[batch_head + 1] - starts
+        pos_idx = starts + np.random.randint(0, lengths)
+        batch_relation = self.train_kg_relations[pos_idx]
+        batch_pos_tail = self.train_kg_tails[pos_idx]
 
-            neg_tail = self.sample_neg_triples_for_h(kg_dict, h, relation[0], 1)
-            batch_neg_tail += neg_tail
+        # negative tails: draw for the whole batch at once and re-draw collisions
+        batch_neg_tail = np.random.randint(0, self.n_users_entities, size=self.kg_batch_size)
+        invalid = np.array([(t, r) in self.train_kg_set[h] for h, r, t in zip(batch_head, batch_relation, batch_neg_tail)])
+        while invalid.any():
+            batch_neg_tail[invalid] = np.random.randint(0, self.n_users_entities, size=int(invalid.sum()))
+            invalid[invalid] = [(t, r) in self.train_kg_set[h] for h, r, t in zip(batch_head[invalid], batch_relation[invalid], batch_neg_tail[invalid])]
 
         batch_head = torch.LongTensor(batch_head)
         batch_relation = torch.LongTensor(batch_relation)
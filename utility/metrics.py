@@ -69,8 +69,11 @@ def ndcg_at_k_batch(hits, k):
     hits_k = hits[:, :k]
     dcg = np.sum((2 ** hits_k - 1) / np.log2(np.arange(2, k + 2)), axis=1)
 
-    sorted_hits_k = np.flip(np.sort(hits), axis=1)[:, :k]
-    idcg = np.sum((2 ** sorted_hits_k - 1) / np.log2(np.arange(2, k + 2)), axis=1)
+    # for binary hits the ideal ranking is simply all positives first, so idcg
+    # is a prefix sum of the precomputed discounts -- no need to sort every row
+    discount_cumsum = np.concatenate([[0.], np.cumsum(1 / np.log2(np.arange(2, k + 2)))])
+    n_pos = np.minimum(hits.sum(axis=1), k).astype(np.int64)
+    idcg = discount_cumsum[n_pos]
     idcg[idcg == 0] = np.inf
 
     res = (dcg / idcg)
@@ -120,22 +123,24 @@ def calc_metrics_at_k(cf_scores, train_user_dict, test_user_dict, user_ids, item
     cf_scores: (n_eval_users, n_eval_items)
     """
     test_pos_item_binary = np.zeros([len(user_ids), len(item_ids)], dtype=np.float32)
-    for idx, u in enumerate(user_ids):
-        train_pos_item_list = train_user_dict[u]
-        test_pos_item_list = test_user_dict[u]
-        cf_scores[idx][train_pos_item_list] = 0
-        test_pos_item_binary[idx][test_pos_item_list] = 1
 
-    try:
-        _, rank_indices = torch.sort(cf_scores.cuda(), descending=True)    # try to speed up the sorting process
-    except:
+    # flatten the per-user positive-item lists once, then mask train items and mark
+    # test items with two fancy-index assignments instead of looping over users
+    train_cols = np.concatenate([train_user_dict[u] for u in user_ids]).astype(np.int64)
+    train_rows = np.repeat(np.arange(len(user_ids)), [len(train_user_dict[u]) for u in user_ids])
+    cf_scores[train_rows, train_cols] = 0
+
+    test_cols = np.concatenate([test_user_dict[u] for u in user_ids]).astype(np.int64)
+    test_rows = np.repeat(np.arange(len(user_ids)), [len(test_user_dict[u]) for u in user_ids])
+    test_pos_item_binary[test_rows, test_cols] = 1
+
+    if torch.cuda.is_available():
+        _, rank_indices = torch.sort(cf_scores.cuda(), descending=True)    # speed up the sorting process
+    else:
         _, rank_indices = torch.sort(cf_scores, descending=True)
     rank_indices = rank_indices.cpu()
 
-    binary_hit = []
-    for i in range(len(user_ids)):
-        binary_hit.append(test_pos_item_binary[i][rank_indices[i]])
-    binary_hit = np.array(binary_hit, dtype=np.float32)
+    binary_hit = np.take_along_axis(test_pos_item_binary, rank_indices.numpy(), axis=1)
 
     precision = precision_at_k_batch(binary_hit, K)
     recall = recall_at_k_batch(binary_hit, K)
@@ -1,3 +1,4 @@
+import ast
 import argparse
 
 
@@ -63,11 +64,18 @@ def parse_kgat_args():
     parser.add_argument('--K', type=int, default=20,
                         help='Calculate metric@K when evaluating.')
 
+    parser.add_argument('--use_torch_compile', type=int, default=0,
+                        help='0: No torch.compile, 1: Compile the model with torch.compile (needs PyTorch >= 2.0).')
+    parser.add_argument('--use_autocast', type=int, default=0,
+                        help='0: Full precision, 1: Run the CF embedding propagation under bfloat16 autocast '
+                             '(experimental; needs PyTorch >= 1.10 and a DGL build with bfloat16 message-passing '
+                             'kernels, ignored when torch.autocast is unavailable).')
+
     args = parser.parse_args()
 
     save_dir = 'trained_model/KGAT/{}/entitydim{}_relationdim{}_{}_{}_lr{}_pretrain{}/'.format(
         args.data_name, args.entity_dim, args.relation_dim, args.aggregation_type,
-        '-'.join([str(i) for i in eval(args.conv_dim_list)]), args.lr, args.use_pretrain)
+        '-'.join([str(i) for i in ast.literal_eval(args.conv_dim_list)]), args.lr, args.use_pretrain)
     args.save_dir = save_dir
 
     return args
@@ -1,3 +1,4 @@
+import ast
 import argparse
 
 
@@ -55,7 +56,7 @@ def parse_nfm_args():
 
     save_dir = 'trained_model/NFM/{}/{}_embeddim{}_{}_lr{}_pretrain{}/'.format(
         args.data_name, args.model_type, args.embed_dim,
-        '-'.join([str(i) for i in eval(args.hidden_dim_list)]), args.lr, args.use_pretrain)
+        '-'.join([str(i) for i in ast.literal_eval(args.hidden_dim_list)]), args.lr, args.use_pretrain)
     args.save_dir = save_dir
 
     return args